@@ -1,16 +1,42 @@
 import asyncio
 import os
+import time
 import json
+import re
+from dataclasses import dataclass, field
 from datetime import datetime
 import websockets
-from pymongo import MongoClient
+from pymongo import MongoClient, ReturnDocument, WriteConcern
 import motor.motor_asyncio
 import bson
 from bson.objectid import ObjectId
 import logging
+import logging.handlers
+from queue import SimpleQueue
 
-# 로깅 설정
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+# JSON 직렬화 설정 - orjson이 설치되어 있으면 사용
+try:
+    import orjson
+
+    def json_dumps(obj):
+        """객체를 JSON 문자열로 직렬화"""
+        return orjson.dumps(obj, default=str).decode("utf-8")
+
+    json_loads = orjson.loads
+except ImportError:
+    def json_dumps(obj):
+        """객체를 JSON 문자열로 직렬화"""
+        return json.dumps(obj, default=str)
+
+    json_loads = json.loads
+
+# 로깅 설정 - 실제 출력은 별도 스레드에서 처리하여 이벤트 루프를 막지 않음
+log_queue = SimpleQueue()
+log_handler = logging.StreamHandler()
+log_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+log_listener = logging.handlers.QueueListener(log_queue, log_handler)
+# QueueHandler는 메시지만 넘기고 전체 형식은 출력 핸들러에서 한 번만 적용
+logging.basicConfig(level=logging.INFO, format='%(message)s', handlers=[logging.handlers.QueueHandler(log_queue)])
 logger = logging.getLogger('slack-server')
 
 # Server configuration
@@ -31,111 +57,264 @@ channels_collection = db['channels']
 messages_collection = db['messages']
 users_collection = db['users']
 
+# 채팅 메시지 일괄 저장은 응답을 기다리지 않음 (w=0)
+message_writes_collection = messages_collection.with_options(write_concern=WriteConcern(w=0))
+
 # 연결된 클라이언트 추적
+@dataclass(slots=True)
+class ClientState:
+    """연결된 클라이언트별 상태"""
+    queue: asyncio.Queue  # 전송 대기 메시지 큐
+    user_id: ObjectId = None
+    username: str = None  # user_id에 대응하는 사용자 이름
+    workspace: str = None  # 채널 목록을 구독 중인 워크스페이스
+    channel: tuple = None  # 메시지를 구독 중인 (워크스페이스, 채널)
+    batch: bool = False  # 배치 프레임 수신 지원 여부
+    drained: asyncio.Event = field(default_factory=asyncio.Event)  # 전송 작업이 큐를 비울 때마다 설정
+
 clients = set()
-client_info = {}  # {websocket: {"user_id": id, "workspace": workspace}}
+client_info = {}  # {websocket: ClientState}
+channel_subscribers = {}  # {(workspace, channel): {websocket, ...}}
+workspace_subscribers = {}  # {workspace: {websocket, ...}} - 채널 목록 업데이트 수신 대상
+
+# 클라이언트별 전송 큐 설정
+CLIENT_QUEUE_SIZE = 256  # 클라이언트별 대기 가능한 최대 메시지 수
+STREAM_QUEUE_HEADROOM = 64  # 스트리밍 중에도 채팅/알림용으로 비워두는 큐 공간
+SEND_TIMEOUT = 5.0  # 전송 및 전송 큐 대기 최대 시간(초)
+WRITE_LIMIT = 2 ** 20  # 소켓 쓰기 버퍼 상한 - 큰 목록/검색 결과도 대기 없이 버퍼에 기록
+MAX_MESSAGE_SIZE = 2 ** 20  # 수신 메시지 최대 크기
+SLOW_CLIENT_CLOSE_CODE = 1013  # 느린 클라이언트 연결 종료 코드 (Try Again Later)
+CHANNEL_DATA_CHUNK_SIZE = 200  # 스트리밍 전송 시 프레임당 메시지 수
+background_tasks = set()  # 실행 중인 백그라운드 작업 참조 유지
+
+# 워크스페이스/채널 목록 캐시 (생성/삭제/수정 시 무효화)
+workspace_cache = {"version": 0, "data": None}
+workspace_cache_lock = asyncio.Lock()
+
+# 워크스페이스/채널 이름 검사 - 제어 문자가 없는 1~64자 문자열만 허용
+VALID_NAME = re.compile(r"[^\x00-\x1f\x7f]{1,64}").fullmatch
+
+# 이름 검사 대상 필드 - 조회에 쓰는 이름과 새로 저장하는 이름 모두 포함
+NAME_FIELDS = ("workspace", "channel", "workspace_name", "channel_name", "old_name", "new_name")
+
+# 이름 검사에 실패한 요청에 보낼 오류 응답 {액션: (응답 액션, 덮어쓸 필드)}
+INVALID_NAME_RESPONSES = {
+    "get_channel_list": ("channel_list", {"message": []}),
+    "get_channel_data": ("channel_data", {"data": []}),
+    "create_workspace": ("create_workspace_response", {}),
+    "create_channel": ("create_channel_response", {}),
+    "delete_workspace": ("delete_workspace_response", {}),
+    "delete_channel": ("delete_channel_response", {}),
+    "update_workspace": ("update_workspace_response", {}),
+    "update_channel": ("update_channel_response", {}),
+    "search": ("search_response", {"results": []})
+}
+
+# 커서 배치 크기 - 예상 결과 수를 한 번의 왕복으로 받도록 설정
+LIST_BATCH_SIZE = 1000  # 워크스페이스/채널 목록
+CHANNEL_DATA_BATCH_SIZE = 1000  # 채널 메시지 기록
+SEARCH_LIMIT = 100  # 검색 결과 최대 개수
+SEARCH_PAGE_SIZE = 20  # 검색 결과 스트리밍 시 프레임당 결과 수
+SEARCH_NON_WORD = re.compile(r"[^\w\s]")  # 텍스트 인덱스로 처리할 수 없는 검색어 판별
+
+# 메시지 조회 시 응답에 필요한 필드만 가져오기
+MESSAGE_PROJECTION = {"_id": 0, "date": 1, "time": 1, "sender": 1, "content": 1}
+
+# 행 배열 형식 응답의 컬럼 순서
+MESSAGE_COLUMNS = ["date", "time", "sender", "message"]
+
+# 응답용 날짜/시간 문자열 캐시 (초 단위)
+timestamp_cache = {"epoch": 0, "date": "", "time": ""}
+
+# 이름 → ObjectId 조회 캐시
+ID_CACHE_TTL = 60  # 캐시 유효 시간(초)
+ID_CACHE_SIZE = 1024  # 캐시별 최대 항목 수
+workspace_id_cache = {}  # {workspace_name: (workspace_id, expires_at)}
+channel_id_cache = {}  # {(workspace_id, channel_name): (channel_id, expires_at)}
+
+# 워크스페이스별 채널 목록 조회 파이프라인
+WORKSPACE_TREE_PIPELINE = [
+    {"$sort": {"name": 1}},
+    {"$lookup": {
+        "from": "channels",
+        "localField": "_id",
+        "foreignField": "workspace_id",
+        "as": "channels"
+    }},
+    {"$project": {"_id": 0, "name": 1, "channels.name": 1}}
+]
+
+# 메시지 저장 큐 설정
+MESSAGE_BATCH_SIZE = 100  # 한 번에 저장할 최대 메시지 수
+MESSAGE_FLUSH_INTERVAL = 0.005  # 메시지를 모으는 최대 대기 시간(초)
+message_queue = asyncio.Queue()
+
+def now_strs():
+    """현재 날짜/시간 문자열 반환 - 같은 초 안에서는 캐시된 값 재사용"""
+    now = int(time.time())
+    if now != timestamp_cache["epoch"]:
+        dt = datetime.fromtimestamp(now)
+        timestamp_cache["epoch"] = now
+        timestamp_cache["date"] = dt.strftime('%Y-%m-%d')
+        timestamp_cache["time"] = dt.strftime("%H:%M:%S")
+    return timestamp_cache["date"], timestamp_cache["time"]
+
+def cache_get(cache, key):
+    """캐시에서 만료되지 않은 값 조회"""
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    value, expires_at = entry
+    if expires_at < time.monotonic():
+        del cache[key]
+        return None
+    return value
+
+def cache_put(cache, key, value):
+    """캐시에 값 저장 - 가득 차면 가장 오래된 항목 제거"""
+    if key not in cache and len(cache) >= ID_CACHE_SIZE:
+        del cache[next(iter(cache))]
+    cache[key] = (value, time.monotonic() + ID_CACHE_TTL)
+
+async def get_workspace_id(workspace_name):
+    """워크스페이스 이름으로 ID 조회 - 없으면 None"""
+    workspace_id = cache_get(workspace_id_cache, workspace_name)
+    if workspace_id is None:
+        workspace = await workspaces_collection.find_one({"name": workspace_name}, {"_id": 1})
+        if not workspace:
+            return None
+        workspace_id = workspace["_id"]
+        cache_put(workspace_id_cache, workspace_name, workspace_id)
+    return workspace_id
+
+async def get_channel_id(workspace_id, channel_name):
+    """워크스페이스 ID와 채널 이름으로 채널 ID 조회 - 없으면 None"""
+    key = (workspace_id, channel_name)
+    channel_id = cache_get(channel_id_cache, key)
+    if channel_id is None:
+        channel = await channels_collection.find_one(
+            {"name": channel_name, "workspace_id": workspace_id},
+            {"_id": 1}
+        )
+        if not channel:
+            return None
+        channel_id = channel["_id"]
+        cache_put(channel_id_cache, key, channel_id)
+    return channel_id
+
+def forget_workspace(workspace_name, workspace_id):
+    """삭제된 워크스페이스와 그 채널을 ID 캐시에서 제거"""
+    workspace_id_cache.pop(workspace_name, None)
+    for key in [key for key in channel_id_cache if key[0] == workspace_id]:
+        del channel_id_cache[key]
+
+def envelope(action, **fields):
+    """서버 응답 공통 형식 생성 - 날짜/시간/보낸 사람/액션 포함"""
+    date, now_time = now_strs()
+    return {"date": date, "time": now_time, "sender": "Server", "action": action, **fields}
 
 # 데이터베이스 초기화 함수
 async def initialize_db():
     """MongoDB 데이터베이스 초기화 - 기본 워크스페이스 및 채널 설정"""
     # 워크스페이스가 없으면 기본 워크스페이스 생성
-    if await workspaces_collection.count_documents({}) == 0:
+    if await workspaces_collection.estimated_document_count() == 0:
+        # ID를 미리 만들어 워크스페이스와 채널을 동시에 저장
+        workspace_id = ObjectId()
         default_workspace = {
+            "_id": workspace_id,
             "name": "실험실",
             "created_at": datetime.now(),
             "updated_at": datetime.now()
         }
-        workspace_id = await workspaces_collection.insert_one(default_workspace)
         
         # 기본 채널 생성
         default_channels = [
             {
                 "name": "전체",
-                "workspace_id": workspace_id.inserted_id,
+                "workspace_id": workspace_id,
                 "description": "모든 구성원을 위한 채널",
                 "created_at": datetime.now(),
                 "updated_at": datetime.now()
             },
             {
                 "name": "소셜",
-                "workspace_id": workspace_id.inserted_id,
+                "workspace_id": workspace_id,
                 "description": "일반적인 대화를 위한 채널",
                 "created_at": datetime.now(),
                 "updated_at": datetime.now()
             }
         ]
-        await channels_collection.insert_many(default_channels)
+        await asyncio.gather(
+            workspaces_collection.insert_one(default_workspace),
+            channels_collection.insert_many(default_channels)
+        )
         logger.info("기본 워크스페이스와 채널이 생성되었습니다.")
+        
+    # 자주 사용하는 조회 조건에 대한 인덱스 생성
+    results = await asyncio.gather(
+        workspaces_collection.create_index("name", unique=True),
+        channels_collection.create_index([("workspace_id", 1), ("name", 1)], unique=True),
+        users_collection.create_index("username", unique=True),
+        messages_collection.create_index([("workspace_id", 1), ("channel_id", 1), ("created_at", 1)]),
+        messages_collection.create_index("channel_id"),
+        # 검색은 메시지 내용만 대상으로 함
+        messages_collection.create_index([("content", "text")], default_language="none"),
+        return_exceptions=True
+    )
+    for result in results:
+        # 기존 데이터에 중복이 있으면 고유 인덱스 생성이 실패하므로 서버는 계속 실행
+        if isinstance(result, Exception):
+            logger.error(f"인덱스 생성 중 오류: {str(result)}")
 
 async def handle_client(websocket):
     """클라이언트 연결 처리"""
     clients.add(websocket)
-    client_info[websocket] = {"user_id": None, "workspace": None}
-    logger.info(f"클라이언트 연결됨. 현재 연결: {len(clients)}개")
+    queue = asyncio.Queue(maxsize=CLIENT_QUEUE_SIZE)
+    client_info[websocket] = ClientState(queue)
+    relay_task = asyncio.create_task(relay_messages(websocket, queue))
+    logger.debug("클라이언트 연결됨. 현재 연결: %d개", len(clients))
     
     try:
         async for message in websocket:
-            logger.info(f"수신: {message[:200]}...")  # 메시지가 너무 길 수 있으므로 일부만 로깅
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("수신: %.200s...", message)  # 메시지가 너무 길 수 있으므로 일부만 로깅
             await handle_message(message, websocket)
     except websockets.exceptions.ConnectionClosed as e:
         logger.info(f"클라이언트 연결 종료: {e}")
     except Exception as e:
         logger.error(f"처리 중 오류 발생: {e}")
     finally:
-        clients.remove(websocket)
-        if websocket in client_info:
-            del client_info[websocket]
-        logger.info(f"클라이언트 연결 해제. 현재 연결: {len(clients)}개")
+        relay_task.cancel()
+        drop_client(websocket)
+        client_info.pop(websocket, None)
+        logger.info("클라이언트 연결 해제. 현재 연결: %d개", len(clients))
 
 async def handle_message(message, websocket):
     """클라이언트 메시지 처리"""
     try:
-        data = json.loads(message)
+        data = json_loads(message)
         action = data.get("action")
         
-        # 유저 정보 업데이트
-        username = data.get("sender", "Unknown")
-        if username != "Unknown" and username != "Server":
-            # 사용자가 존재하는지 확인하고 없으면 생성
-            user = await users_collection.find_one({"username": username})
-            if not user:
-                user_id = await users_collection.insert_one({
-                    "username": username,
-                    "created_at": datetime.now()
-                })
-                user_id = user_id.inserted_id
-            else:
-                user_id = user["_id"]
-            
-            # 클라이언트 정보 업데이트
-            client_info[websocket]["user_id"] = user_id
+        # 잘못된 워크스페이스/채널 이름은 DB 조회 전에 거부
+        # (빈 문자열은 검색 필터 생략 등으로 각 처리 함수에서 처리)
+        for field in NAME_FIELDS:
+            value = data.get(field)
+            if value is not None and value != "" and not (isinstance(value, str) and VALID_NAME(value)):
+                logger.warning(f"잘못된 {field} 값으로 요청 거부: {action}")
+                reject_request(websocket, action, f"잘못된 {field} 값입니다.")
+                return
+        
+        # 채팅 메시지는 받은 프레임을 다시 직렬화하지 않고 그대로 전달
+        if action == "send_message":
+            if isinstance(message, bytes):
+                message = message.decode("utf-8")
+            await send_chat_message(data, websocket, message)
+            return
             
         # 액션 처리
-        if action == "send_message":
-            await store_message(data)
-            await broadcast(message, websocket)
-        elif action == "register_user":
-            await register_user(data, websocket)
-        elif action == "get_workspace_list":
-            await send_workspace_list(data, websocket)
-        elif action == "get_channel_list":
-            await send_channel_list(data, websocket)
-        elif action == "get_channel_data":
-            await send_channel_data(data, websocket)
-        elif action == "create_workspace":
-            await create_workspace(data, websocket)
-        elif action == "create_channel":
-            await create_channel(data, websocket)
-        elif action == "delete_workspace":
-            await delete_workspace(data, websocket)
-        elif action == "delete_channel":
-            await delete_channel(data, websocket)
-        elif action == "update_workspace":
-            await update_workspace(data, websocket)
-        elif action == "update_channel":
-            await update_channel(data, websocket)
-        elif action == "search":
-            await search_messages(data, websocket)
+        handler = ACTION_HANDLERS.get(action)
+        if handler:
+            await handler(data, websocket)
         else:
             logger.warning(f"알 수 없는 액션: {action}")
     except json.JSONDecodeError:
@@ -143,6 +322,27 @@ async def handle_message(message, websocket):
     except Exception as e:
         logger.error(f"메시지 처리 중 오류 발생: {str(e)}")
 
+def reject_request(websocket, action, error):
+    """요청한 액션의 오류 응답 전송 - 응답이 없는 액션은 무시"""
+    spec = INVALID_NAME_RESPONSES.get(action)
+    if spec is None:
+        return
+    response_action, fields = spec
+    response = envelope(response_action, status="error", message=error)
+    response.update(fields)
+    send_response(websocket, response)
+
+async def ensure_user(username):
+    """사용자 ID 반환 - 없으면 생성 (한 번의 upsert로 처리)"""
+    user = await users_collection.find_one_and_update(
+        {"username": username},
+        {"$setOnInsert": {"username": username, "created_at": datetime.now()}},
+        projection={"_id": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return user["_id"]
+
 async def register_user(data, websocket):
     """사용자 등록/업데이트"""
     username = data.get("username")
@@ -150,41 +350,39 @@ async def register_user(data, websocket):
         return
         
     try:
-        user = await users_collection.find_one({"username": username})
-        if not user:
-            result = await users_collection.insert_one({
-                "username": username,
-                "created_at": datetime.now()
-            })
-            user_id = result.inserted_id
-        else:
-            user_id = user["_id"]
-            
-        client_info[websocket]["user_id"] = user_id
+        user_id = await ensure_user(username)
+        client_info[websocket].user_id = user_id
+        client_info[websocket].username = username
+        # 배치 프레임 수신 지원 여부
+        client_info[websocket].batch = bool(data.get("batch", False))
         
         # 응답 전송
-        response = {
-            "date": datetime.now().strftime('%Y-%m-%d'),
-            "time": datetime.now().strftime("%H:%M:%S"),
-            "sender": "Server",
-            "action": "register_user_response",
-            "status": "success",
-            "message": f"사용자 '{username}' 등록 성공"
-        }
-        await websocket.send(json.dumps(response))
+        response = envelope(
+            "register_user_response",
+            status="success",
+            message=f"사용자 '{username}' 등록 성공"
+        )
+        send_response(websocket, response)
     except Exception as e:
         logger.error(f"사용자 등록 중 오류: {str(e)}")
-        response = {
-            "date": datetime.now().strftime('%Y-%m-%d'),
-            "time": datetime.now().strftime("%H:%M:%S"),
-            "sender": "Server",
-            "action": "register_user_response",
-            "status": "error",
-            "message": f"사용자 등록 중 오류 발생: {str(e)}"
-        }
-        await websocket.send(json.dumps(response))
+        response = envelope(
+            "register_user_response",
+            status="error",
+            message=f"사용자 등록 중 오류 발생: {str(e)}"
+        )
+        send_response(websocket, response)
 
-async def store_message(data):
+async def send_chat_message(data, websocket, message):
+    """채팅 메시지 저장 후 채널 구독자에게 받은 프레임 그대로 전달"""
+    await store_message(data, websocket)
+    await broadcast(
+        message,
+        websocket,
+        data.get("workspace", "default"),
+        data.get("channel", "default").strip("#")
+    )
+
+async def store_message(data, websocket=None):
     """메시지를 MongoDB에 저장"""
     try:
         # 필요한 데이터 추출
@@ -192,71 +390,120 @@ async def store_message(data):
         channel_name = data.get("channel", "default").strip("#")
         sender = data.get("sender", "Unknown")
         
-        # 워크스페이스 ID 찾기
-        workspace = await workspaces_collection.find_one({"name": workspace_name})
-        if not workspace:
-            # 없으면 기본 워크스페이스 사용
-            workspace = await workspaces_collection.find_one({})
-            
-        # 채널 ID 찾기
-        channel = await channels_collection.find_one({
-            "name": channel_name,
-            "workspace_id": workspace["_id"]
-        })
-        
-        if not channel:
-            # 없으면 기본 채널 사용
-            channel = await channels_collection.find_one({"workspace_id": workspace["_id"]})
-        
-        # 사용자 ID 찾기
-        user = await users_collection.find_one({"username": sender})
-        if not user:
-            user_result = await users_collection.insert_one({
-                "username": sender,
-                "created_at": datetime.now()
-            })
-            user_id = user_result.inserted_id
+        # 사용자 ID 찾기 - 이 연결에서 이미 확인한 사용자면 DB 조회 생략
+        info = client_info.get(websocket)
+        if info is not None and info.username == sender:
+            workspace_id, channel_id = await resolve_message_target(workspace_name, channel_name)
+            user_id = info.user_id
         else:
-            user_id = user["_id"]
+            # 채널 위치와 사용자 ID는 서로 관계가 없으므로 동시에 조회
+            (workspace_id, channel_id), user_id = await asyncio.gather(
+                resolve_message_target(workspace_name, channel_name),
+                ensure_user(sender)
+            )
+            if info is not None:
+                info.user_id = user_id
+                info.username = sender
             
-        # 메시지 저장
+        # 메시지 저장 - 날짜/시간이 없으면 서버 시각 사용
+        now_date, now_time = now_strs()
         message_data = {
-            "workspace_id": workspace["_id"],
-            "channel_id": channel["_id"],
+            "workspace_id": workspace_id,
+            "channel_id": channel_id,
             "user_id": user_id,
             "sender": sender,
             "content": data.get("message", ""),
-            "date": data.get("date", datetime.now().strftime('%Y-%m-%d')),
-            "time": data.get("time", datetime.now().strftime("%H:%M:%S")),
+            "date": data.get("date", now_date),
+            "time": data.get("time", now_time),
             "created_at": datetime.now()
         }
         
-        await messages_collection.insert_one(message_data)
-        logger.info(f"메시지 저장됨: {sender} -> {channel_name}")
+        message_queue.put_nowait(message_data)
+        logger.debug("메시지 저장 대기: %s -> %s", sender, channel_name)
     except Exception as e:
         logger.error(f"메시지 저장 중 오류: {str(e)}")
 
+async def resolve_message_target(workspace_name, channel_name):
+    """메시지를 저장할 워크스페이스/채널 ID 반환 - 없으면 기본값 사용"""
+    # 워크스페이스 ID 찾기
+    workspace_id = await get_workspace_id(workspace_name)
+    if workspace_id is None:
+        # 없으면 기본 워크스페이스 사용
+        workspace = await workspaces_collection.find_one({}, {"_id": 1})
+        workspace_id = workspace["_id"]
+        
+    # 채널 ID 찾기
+    channel_id = await get_channel_id(workspace_id, channel_name)
+    if channel_id is None:
+        # 없으면 기본 채널 사용
+        channel = await channels_collection.find_one({"workspace_id": workspace_id}, {"_id": 1})
+        channel_id = channel["_id"]
+    return workspace_id, channel_id
+
+async def message_writer():
+    """저장 대기 중인 메시지를 모아서 MongoDB에 일괄 저장"""
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = []
+        try:
+            batch.append(await message_queue.get())
+            
+            # 첫 메시지 이후 잠시 동안 들어오는 메시지를 함께 모음
+            deadline = loop.time() + MESSAGE_FLUSH_INTERVAL
+            while len(batch) < MESSAGE_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(message_queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+        except asyncio.CancelledError:
+            # 종료 시 모으던 메시지는 큐로 되돌려 main()에서 저장
+            for message_data in batch:
+                message_queue.put_nowait(message_data)
+            raise
+            
+        write_task = asyncio.ensure_future(write_messages(batch))
+        try:
+            await asyncio.shield(write_task)
+        except asyncio.CancelledError:
+            # 종료 중이어도 이미 시작한 저장은 끝날 때까지 기다림
+            await write_task
+            raise
+
+async def write_messages(batch):
+    """모은 메시지를 한 번에 저장"""
+    try:
+        if len(batch) == 1:
+            await message_writes_collection.insert_one(batch[0])
+        else:
+            await message_writes_collection.insert_many(batch, ordered=False)
+        logger.debug("메시지 %d개 저장됨", len(batch))
+    except Exception as e:
+        logger.error(f"메시지 일괄 저장 중 오류: {str(e)}")
+
 async def create_workspace(data, websocket):
     """새 워크스페이스 생성"""
     workspace_name = data.get("workspace_name", "").strip()
     if not workspace_name:
-        response = {
-            "action": "create_workspace_response",
-            "status": "error",
-            "message": "워크스페이스 이름이 필요합니다."
-        }
-        await websocket.send(json.dumps(response))
+        response = envelope(
+            "create_workspace_response",
+            status="error",
+            message="워크스페이스 이름이 필요합니다."
+        )
+        send_response(websocket, response)
         return
         
     try:
         # 이미 존재하는지 확인
-        existing = await workspaces_collection.find_one({"name": workspace_name})
+        existing = await get_workspace_id(workspace_name)
         if existing:
-            response = {
-                "action": "create_workspace_response",
-                "status": "error",
-                "message": f"'{workspace_name}' 워크스페이스가 이미 존재합니다."
-            }
+            response = envelope(
+                "create_workspace_response",
+                status="error",
+                message=f"'{workspace_name}' 워크스페이스가 이미 존재합니다."
+            )
         else:
             # 새 워크스페이스 생성
             workspace = {
@@ -285,24 +532,26 @@ async def create_workspace(data, websocket):
                 }
             ]
             await channels_collection.insert_many(default_channels)
+            invalidate_workspace_cache()
+            cache_put(workspace_id_cache, workspace_name, workspace_id)
             
-            response = {
-                "action": "create_workspace_response",
-                "status": "success",
-                "message": f"'{workspace_name}' 워크스페이스가 생성되었습니다.",
-                "workspace_id": str(workspace_id)
-            }
+            response = envelope(
+                "create_workspace_response",
+                status="success",
+                message=f"'{workspace_name}' 워크스페이스가 생성되었습니다.",
+                workspace_id=str(workspace_id)
+            )
             
-        await websocket.send(json.dumps(response))
+        send_response(websocket, response)
         # 모든 클라이언트에게 워크스페이스 목록 업데이트 알림
         await broadcast_workspace_update()
     except Exception as e:
-        response = {
-            "action": "create_workspace_response",
-            "status": "error",
-            "message": f"워크스페이스 생성 중 오류 발생: {str(e)}"
-        }
-        await websocket.send(json.dumps(response))
+        response = envelope(
+            "create_workspace_response",
+            status="error",
+            message=f"워크스페이스 생성 중 오류 발생: {str(e)}"
+        )
+        send_response(websocket, response)
         logger.error(f"워크스페이스 생성 중 오류: {str(e)}")
 
 async def create_channel(data, websocket):
@@ -312,66 +561,65 @@ async def create_channel(data, websocket):
     description = data.get("description", "")
     
     if not channel_name:
-        response = {
-            "action": "create_channel_response",
-            "status": "error",
-            "message": "채널 이름이 필요합니다."
-        }
-        await websocket.send(json.dumps(response))
+        response = envelope(
+            "create_channel_response",
+            status="error",
+            message="채널 이름이 필요합니다."
+        )
+        send_response(websocket, response)
         return
         
     try:
         # 워크스페이스 찾기
-        workspace = await workspaces_collection.find_one({"name": workspace_name})
-        if not workspace:
-            response = {
-                "action": "create_channel_response",
-                "status": "error",
-                "message": f"'{workspace_name}' 워크스페이스를 찾을 수 없습니다."
-            }
-            await websocket.send(json.dumps(response))
+        workspace_id = await get_workspace_id(workspace_name)
+        if workspace_id is None:
+            response = envelope(
+                "create_channel_response",
+                status="error",
+                message=f"'{workspace_name}' 워크스페이스를 찾을 수 없습니다."
+            )
+            send_response(websocket, response)
             return
             
         # 이미 존재하는 채널인지 확인
-        existing = await channels_collection.find_one({
-            "name": channel_name,
-            "workspace_id": workspace["_id"]
-        })
+        existing = await get_channel_id(workspace_id, channel_name)
         
         if existing:
-            response = {
-                "action": "create_channel_response",
-                "status": "error",
-                "message": f"'{channel_name}' 채널이 해당 워크스페이스에 이미 존재합니다."
-            }
+            response = envelope(
+                "create_channel_response",
+                status="error",
+                message=f"'{channel_name}' 채널이 해당 워크스페이스에 이미 존재합니다."
+            )
         else:
             # 새 채널 생성
             channel = {
                 "name": channel_name,
-                "workspace_id": workspace["_id"],
+                "workspace_id": workspace_id,
                 "description": description,
                 "created_at": datetime.now(),
                 "updated_at": datetime.now()
             }
             result = await channels_collection.insert_one(channel)
+            invalidate_workspace_cache()
+            cache_put(channel_id_cache, (workspace_id, channel_name), result.inserted_id)
             
-            response = {
-                "action": "create_channel_response",
-                "status": "success",
-                "message": f"'{channel_name}' 채널이 생성되었습니다.",
-                "channel_id": str(result.inserted_id)
-            }
+            response = envelope(
+                "create_channel_response",
+                status="success",
+                message=f"'{channel_name}' 채널이 생성되었습니다.",
+                channel_id=str(result.inserted_id)
+            )
             
-        await websocket.send(json.dumps(response))
+        send_response(websocket, response)
         # 해당 워크스페이스의 모든 클라이언트에게 채널 목록 업데이트 알림
         await broadcast_channel_update(workspace_name)
     except Exception as e:
-        response = {
-            "action": "create_channel_response",
-            "status": "error",
-            "message": f"채널 생성 중 오류 발생: {str(e)}"
-        }
-        await websocket.send(json.dumps(response))
+        response = envelope(
+            "create_channel_response",
+            status="error",
+            message=f"채널 생성 중 오류 발생: {str(e)}"
+        )
+        send_response(websocket, response)
         logger.error(f"채널 생성 중 오류: {str(e)}")
 
 async def delete_workspace(data, websocket):
@@ -379,51 +627,54 @@ async def delete_workspace(data, websocket):
     workspace_name = data.get("workspace", "").strip()
     
     if not workspace_name:
-        response = {
-            "action": "delete_workspace_response",
-            "status": "error",
-            "message": "워크스페이스 이름이 필요합니다."
-        }
-        await websocket.send(json.dumps(response))
+        response = envelope(
+            "delete_workspace_response",
+            status="error",
+            message="워크스페이스 이름이 필요합니다."
+        )
+        send_response(websocket, response)
         return
         
     try:
         # 워크스페이스 찾기
-        workspace = await workspaces_collection.find_one({"name": workspace_name})
-        if not workspace:
-            response = {
-                "action": "delete_workspace_response",
-                "status": "error",
-                "message": f"'{workspace_name}' 워크스페이스를 찾을 수 없습니다."
-            }
-            await websocket.send(json.dumps(response))
+        workspace_id = await get_workspace_id(workspace_name)
+        if workspace_id is None:
+            response = envelope(
+                "delete_workspace_response",
+                status="error",
+                message=f"'{workspace_name}' 워크스페이스를 찾을 수 없습니다."
+            )
+            send_response(websocket, response)
             return
             
         # 워크스페이스 관련 채널 삭제
-        await channels_collection.delete_many({"workspace_id": workspace["_id"]})
+        await channels_collection.delete_many({"workspace_id": workspace_id})
         
         # 워크스페이스 관련 메시지 삭제
-        await messages_collection.delete_many({"workspace_id": workspace["_id"]})
+        await messages_collection.delete_many({"workspace_id": workspace_id})
         
         # 워크스페이스 삭제
-        await workspaces_collection.delete_one({"_id": workspace["_id"]})
+        await workspaces_collection.delete_one({"_id": workspace_id})
+        invalidate_workspace_cache()
+        forget_workspace(workspace_name, workspace_id)
+        move_workspace_subscribers(workspace_name, None)
         
-        response = {
-            "action": "delete_workspace_response",
-            "status": "success",
-            "message": f"'{workspace_name}' 워크스페이스가 삭제되었습니다."
-        }
+        response = envelope(
+            "delete_workspace_response",
+            status="success",
+            message=f"'{workspace_name}' 워크스페이스가 삭제되었습니다."
+        )
         
-        await websocket.send(json.dumps(response))
+        send_response(websocket, response)
         # 모든 클라이언트에게 워크스페이스 목록 업데이트 알림
         await broadcast_workspace_update()
     except Exception as e:
-        response = {
-            "action": "delete_workspace_response",
-            "status": "error",
-            "message": f"워크스페이스 삭제 중 오류 발생: {str(e)}"
-        }
-        await websocket.send(json.dumps(response))
+        response = envelope(
+            "delete_workspace_response",
+            status="error",
+            message=f"워크스페이스 삭제 중 오류 발생: {str(e)}"
+        )
+        send_response(websocket, response)
         logger.error(f"워크스페이스 삭제 중 오류: {str(e)}")
 
 async def delete_channel(data, websocket):
@@ -432,63 +683,62 @@ async def delete_channel(data, websocket):
     channel_name = data.get("channel", "").strip().strip("#")
     
     if not channel_name or not workspace_name:
-        response = {
-            "action": "delete_channel_response",
-            "status": "error",
-            "message": "워크스페이스와 채널 이름이 필요합니다."
-        }
-        await websocket.send(json.dumps(response))
+        response = envelope(
+            "delete_channel_response",
+            status="error",
+            message="워크스페이스와 채널 이름이 필요합니다."
+        )
+        send_response(websocket, response)
         return
         
     try:
         # 워크스페이스 찾기
-        workspace = await workspaces_collection.find_one({"name": workspace_name})
-        if not workspace:
-            response = {
-                "action": "delete_channel_response",
-                "status": "error",
-                "message": f"'{workspace_name}' 워크스페이스를 찾을 수 없습니다."
-            }
-            await websocket.send(json.dumps(response))
+        workspace_id = await get_workspace_id(workspace_name)
+        if workspace_id is None:
+            response = envelope(
+                "delete_channel_response",
+                status="error",
+                message=f"'{workspace_name}' 워크스페이스를 찾을 수 없습니다."
+            )
+            send_response(websocket, response)
             return
             
         # 채널 찾기
-        channel = await channels_collection.find_one({
-            "name": channel_name,
-            "workspace_id": workspace["_id"]
-        })
-        
-        if not channel:
-            response = {
-                "action": "delete_channel_response",
-                "status": "error",
-                "message": f"'{channel_name}' 채널을 찾을 수 없습니다."
-            }
-            await websocket.send(json.dumps(response))
+        channel_id = await get_channel_id(workspace_id, channel_name)
+        if channel_id is None:
+            response = envelope(
+                "delete_channel_response",
+                status="error",
+                message=f"'{channel_name}' 채널을 찾을 수 없습니다."
+            )
+            send_response(websocket, response)
             return
             
         # 채널의 메시지 삭제
-        await messages_collection.delete_many({"channel_id": channel["_id"]})
+        await messages_collection.delete_many({"channel_id": channel_id})
         
         # 채널 삭제
-        await channels_collection.delete_one({"_id": channel["_id"]})
+        await channels_collection.delete_one({"_id": channel_id})
+        invalidate_workspace_cache()
+        channel_id_cache.pop((workspace_id, channel_name), None)
+        move_channel_subscribers((workspace_name, channel_name), None)
         
-        response = {
-            "action": "delete_channel_response",
-            "status": "success",
-            "message": f"'{channel_name}' 채널이 삭제되었습니다."
-        }
+        response = envelope(
+            "delete_channel_response",
+            status="success",
+            message=f"'{channel_name}' 채널이 삭제되었습니다."
+        )
         
-        await websocket.send(json.dumps(response))
+        send_response(websocket, response)
         # 해당 워크스페이스의 모든 클라이언트에게 채널 목록 업데이트 알림
         await broadcast_channel_update(workspace_name)
     except Exception as e:
-        response = {
-            "action": "delete_channel_response",
-            "status": "error",
-            "message": f"채널 삭제 중 오류 발생: {str(e)}"
-        }
-        await websocket.send(json.dumps(response))
+        response = envelope(
+            "delete_channel_response",
+            status="error",
+            message=f"채널 삭제 중 오류 발생: {str(e)}"
+        )
+        send_response(websocket, response)
         logger.error(f"채널 삭제 중 오류: {str(e)}")
 
 async def update_workspace(data, websocket):
@@ -497,60 +747,65 @@ async def update_workspace(data, websocket):
     new_name = data.get("new_name", "").strip()
     
     if not old_name or not new_name:
-        response = {
-            "action": "update_workspace_response",
-            "status": "error",
-            "message": "기존 이름과 새 이름이 필요합니다."
-        }
-        await websocket.send(json.dumps(response))
+        response = envelope(
+            "update_workspace_response",
+            status="error",
+            message="기존 이름과 새 이름이 필요합니다."
+        )
+        send_response(websocket, response)
         return
         
     try:
         # 워크스페이스 찾기
-        workspace = await workspaces_collection.find_one({"name": old_name})
-        if not workspace:
-            response = {
-                "action": "update_workspace_response",
-                "status": "error",
-                "message": f"'{old_name}' 워크스페이스를 찾을 수 없습니다."
-            }
-            await websocket.send(json.dumps(response))
+        workspace_id = await get_workspace_id(old_name)
+        if workspace_id is None:
+            response = envelope(
+                "update_workspace_response",
+                status="error",
+                message=f"'{old_name}' 워크스페이스를 찾을 수 없습니다."
+            )
+            send_response(websocket, response)
             return
             
         # 이름 중복 확인
         if old_name != new_name:
-            existing = await workspaces_collection.find_one({"name": new_name})
+            existing = await get_workspace_id(new_name)
             if existing:
-                response = {
-                    "action": "update_workspace_response",
-                    "status": "error",
-                    "message": f"'{new_name}' 워크스페이스가 이미 존재합니다."
-                }
-                await websocket.send(json.dumps(response))
+                response = envelope(
+                    "update_workspace_response",
+                    status="error",
+                    message=f"'{new_name}' 워크스페이스가 이미 존재합니다."
+                )
+                send_response(websocket, response)
                 return
         
         # 워크스페이스 업데이트
         await workspaces_collection.update_one(
-            {"_id": workspace["_id"]},
+            {"_id": workspace_id},
             {"$set": {"name": new_name, "updated_at": datetime.now()}}
         )
+        invalidate_workspace_cache()
+        workspace_id_cache.pop(old_name, None)
+        if old_name != new_name:
+            # 보고 있던 클라이언트가 새 이름으로 계속 알림을 받도록 구독 이동
+            move_workspace_subscribers(old_name, new_name)
         
-        response = {
-            "action": "update_workspace_response",
-            "status": "success",
-            "message": f"워크스페이스 이름이 '{old_name}'에서 '{new_name}'으로 변경되었습니다."
-        }
+        response = envelope(
+            "update_workspace_response",
+            status="success",
+            message=f"워크스페이스 이름이 '{old_name}'에서 '{new_name}'으로 변경되었습니다."
+        )
         
-        await websocket.send(json.dumps(response))
+        send_response(websocket, response)
         # 모든 클라이언트에게 워크스페이스 목록 업데이트 알림
         await broadcast_workspace_update()
     except Exception as e:
-        response = {
-            "action": "update_workspace_response",
-            "status": "error",
-            "message": f"워크스페이스 업데이트 중 오류 발생: {str(e)}"
-        }
-        await websocket.send(json.dumps(response))
+        response = envelope(
+            "update_workspace_response",
+            status="error",
+            message=f"워크스페이스 업데이트 중 오류 발생: {str(e)}"
+        )
+        send_response(websocket, response)
         logger.error(f"워크스페이스 업데이트 중 오류: {str(e)}")
 
 async def update_channel(data, websocket):
@@ -561,55 +816,47 @@ async def update_channel(data, websocket):
     description = data.get("description", None)
     
     if not workspace_name or not old_name or not new_name:
-        response = {
-            "action": "update_channel_response",
-            "status": "error",
-            "message": "워크스페이스 이름, 기존 채널 이름, 새 채널 이름이 필요합니다."
-        }
-        await websocket.send(json.dumps(response))
+        response = envelope(
+            "update_channel_response",
+            status="error",
+            message="워크스페이스 이름, 기존 채널 이름, 새 채널 이름이 필요합니다."
+        )
+        send_response(websocket, response)
         return
         
     try:
         # 워크스페이스 찾기
-        workspace = await workspaces_collection.find_one({"name": workspace_name})
-        if not workspace:
-            response = {
-                "action": "update_channel_response",
-                "status": "error",
-                "message": f"'{workspace_name}' 워크스페이스를 찾을 수 없습니다."
-            }
-            await websocket.send(json.dumps(response))
+        workspace_id = await get_workspace_id(workspace_name)
+        if workspace_id is None:
+            response = envelope(
+                "update_channel_response",
+                status="error",
+                message=f"'{workspace_name}' 워크스페이스를 찾을 수 없습니다."
+            )
+            send_response(websocket, response)
             return
             
         # 채널 찾기
-        channel = await channels_collection.find_one({
-            "name": old_name,
-            "workspace_id": workspace["_id"]
-        })
-        
-        if not channel:
-            response = {
-                "action": "update_channel_response",
-                "status": "error",
-                "message": f"'{old_name}' 채널을 찾을 수 없습니다."
-            }
-            await websocket.send(json.dumps(response))
+        channel_id = await get_channel_id(workspace_id, old_name)
+        if channel_id is None:
+            response = envelope(
+                "update_channel_response",
+                status="error",
+                message=f"'{old_name}' 채널을 찾을 수 없습니다."
+            )
+            send_response(websocket, response)
             return
             
         # 이름 중복 확인
         if old_name != new_name:
-            existing = await channels_collection.find_one({
-                "name": new_name,
-                "workspace_id": workspace["_id"]
-            })
-            
+            existing = await get_channel_id(workspace_id, new_name)
             if existing:
-                response = {
-                    "action": "update_channel_response",
-                    "status": "error",
-                    "message": f"'{new_name}' 채널이 해당 워크스페이스에 이미 존재합니다."
-                }
-                await websocket.send(json.dumps(response))
+                response = envelope(
+                    "update_channel_response",
+                    status="error",
+                    message=f"'{new_name}' 채널이 해당 워크스페이스에 이미 존재합니다."
+                )
+                send_response(websocket, response)
                 return
                 
         # 업데이트할 필드
@@ -619,103 +866,106 @@ async def update_channel(data, websocket):
         
         # 채널 업데이트
         await channels_collection.update_one(
-            {"_id": channel["_id"]},
+            {"_id": channel_id},
             {"$set": update_fields}
         )
+        invalidate_workspace_cache()
+        channel_id_cache.pop((workspace_id, old_name), None)
+        if old_name != new_name:
+            # 보고 있던 클라이언트가 새 이름으로 보낸 메시지도 받도록 구독 이동
+            move_channel_subscribers((workspace_name, old_name), (workspace_name, new_name))
         
-        response = {
-            "action": "update_channel_response",
-            "status": "success",
-            "message": f"채널 이름이 '{old_name}'에서 '{new_name}'으로 변경되었습니다."
-        }
+        response = envelope(
+            "update_channel_response",
+            status="success",
+            message=f"채널 이름이 '{old_name}'에서 '{new_name}'으로 변경되었습니다."
+        )
         
-        await websocket.send(json.dumps(response))
+        send_response(websocket, response)
         # 해당 워크스페이스의 모든 클라이언트에게 채널 목록 업데이트 알림
         await broadcast_channel_update(workspace_name)
     except Exception as e:
-        response = {
-            "action": "update_channel_response",
-            "status": "error",
-            "message": f"채널 업데이트 중 오류 발생: {str(e)}"
-        }
-        await websocket.send(json.dumps(response))
+        response = envelope(
+            "update_channel_response",
+            status="error",
+            message=f"채널 업데이트 중 오류 발생: {str(e)}"
+        )
+        send_response(websocket, response)
         logger.error(f"채널 업데이트 중 오류: {str(e)}")
 
-async def send_workspace_list(data, websocket):
-    """워크스페이스 목록 전송"""
-    try:
+def invalidate_workspace_cache():
+    """워크스페이스/채널 목록 캐시 무효화"""
+    workspace_cache["version"] += 1
+    workspace_cache["data"] = None
+
+async def get_workspace_tree():
+    """워크스페이스별 채널 목록 반환 - 캐시가 없을 때만 MongoDB 조회"""
+    if workspace_cache["data"] is not None:
+        return workspace_cache["data"]
+        
+    # 동시에 캐시가 비어 있어도 MongoDB 조회는 한 번만 수행
+    async with workspace_cache_lock:
+        if workspace_cache["data"] is not None:
+            return workspace_cache["data"]
+            
+        version = workspace_cache["version"]
         workspaces = {}
-        # 모든 워크스페이스 찾기
-        cursor = workspaces_collection.find({}).sort("name", 1)
+        # 워크스페이스와 채널을 한 번의 aggregation으로 조회
+        cursor = workspaces_collection.aggregate(WORKSPACE_TREE_PIPELINE, batchSize=LIST_BATCH_SIZE)
         async for workspace in cursor:
-            workspace_name = workspace["name"]
-            workspaces[workspace_name] = []
+            workspaces[workspace["name"]] = sorted(channel["name"] for channel in workspace["channels"])
             
-            # 해당 워크스페이스의 채널 찾기
-            channel_cursor = channels_collection.find({"workspace_id": workspace["_id"]}).sort("name", 1)
-            async for channel in channel_cursor:
-                workspaces[workspace_name].append(channel["name"])
-                
-        response = {
-            "date": datetime.now().strftime('%Y-%m-%d'),
-            "time": datetime.now().strftime("%H:%M:%S"),
-            "sender": "Server",
-            "action": "workspace_list",
-            "message": workspaces
-        }
+        # 조회 중에 변경이 없었던 경우에만 캐시에 저장
+        if version == workspace_cache["version"]:
+            workspace_cache["data"] = workspaces
+        return workspaces
+
+async def send_workspace_list(data, websocket):
+    """워크스페이스 목록 전송"""
+    try:
+        workspaces = await get_workspace_tree()
         
-        await websocket.send(json.dumps(response))
+        response = envelope(
+            "workspace_list",
+            message=workspaces
+        )
+        
+        send_response(websocket, response)
     except Exception as e:
         logger.error(f"워크스페이스 목록 전송 중 오류: {str(e)}")
-        response = {
-            "date": datetime.now().strftime('%Y-%m-%d'),
-            "time": datetime.now().strftime("%H:%M:%S"),
-            "sender": "Server",
-            "action": "workspace_list",
-            "status": "error",
-            "message": {}
-        }
-        await websocket.send(json.dumps(response))
+        response = envelope(
+            "workspace_list",
+            status="error",
+            message={}
+        )
+        send_response(websocket, response)
 
 async def send_channel_list(data, websocket):
     """특정 워크스페이스의 채널 목록 전송"""
     workspace_name = data.get("workspace", "default")
     
     try:
-        # 워크스페이스 찾기
-        workspace = await workspaces_collection.find_one({"name": workspace_name})
-        
-        channels = []
-        if workspace:
-            # 해당 워크스페이스의 채널 찾기
-            channel_cursor = channels_collection.find({"workspace_id": workspace["_id"]}).sort("name", 1)
-            async for channel in channel_cursor:
-                channels.append(channel["name"])
-                
-        response = {
-            "date": datetime.now().strftime('%Y-%m-%d'),
-            "time": datetime.now().strftime("%H:%M:%S"),
-            "sender": "Server",
-            "action": "channel_list",
-            "workspace": workspace_name,
-            "message": channels
-        }
+        workspaces = await get_workspace_tree()
+        channels = workspaces.get(workspace_name, [])
+        
+        response = envelope(
+            "channel_list",
+            workspace=workspace_name,
+            message=channels
+        )
         
-        await websocket.send(json.dumps(response))
+        send_response(websocket, response)
         
-        # 클라이언트 정보 업데이트
-        client_info[websocket]["workspace"] = workspace_name
+        # 채널 목록 업데이트를 받을 워크스페이스 구독
+        subscribe_workspace(websocket, workspace_name)
     except Exception as e:
         logger.error(f"채널 목록 전송 중 오류: {str(e)}")
-        response = {
-            "date": datetime.now().strftime('%Y-%m-%d'),
-            "time": datetime.now().strftime("%H:%M:%S"),
-            "sender": "Server",
-            "action": "channel_list",
-            "status": "error",
-            "message": []
-        }
-        await websocket.send(json.dumps(response))
+        response = envelope(
+            "channel_list",
+            status="error",
+            message=[]
+        )
+        send_response(websocket, response)
 
 async def send_channel_data(data, websocket):
     """특정 채널의 메시지 데이터 전송"""
@@ -724,77 +974,139 @@ async def send_channel_data(data, websocket):
     
     try:
         # 워크스페이스 찾기
-        workspace = await workspaces_collection.find_one({"name": workspace_name})
-        if not workspace:
-            response = {
-                "date": datetime.now().strftime('%Y-%m-%d'),
-                "time": datetime.now().strftime("%H:%M:%S"),
-                "sender": "Server",
-                "action": "channel_data",
-                "status": "error",
-                "message": f"워크스페이스 '{workspace_name}'를 찾을 수 없습니다.",
-                "data": []
-            }
-            await websocket.send(json.dumps(response))
+        workspace_id = await get_workspace_id(workspace_name)
+        if workspace_id is None:
+            response = envelope(
+                "channel_data",
+                status="error",
+                message=f"워크스페이스 '{workspace_name}'를 찾을 수 없습니다.",
+                data=[]
+            )
+            send_response(websocket, response)
             return
             
         # 채널 찾기
-        channel = await channels_collection.find_one({
-            "name": channel_name,
-            "workspace_id": workspace["_id"]
-        })
+        channel_id = await get_channel_id(workspace_id, channel_name)
+        if channel_id is None:
+            response = envelope(
+                "channel_data",
+                status="error",
+                message=f"채널 '{channel_name}'을 찾을 수 없습니다.",
+                data=[]
+            )
+            send_response(websocket, response)
+            return
+            
+        # 기록을 조회하는 동안 보낸 메시지도 받도록 조회 전에 구독 등록
+        # (조회 결과와 실시간 메시지가 겹칠 수 있으므로 중복은 클라이언트에서 처리)
+        subscribe_channel(websocket, workspace_name, channel_name)
         
-        if not channel:
-            response = {
-                "date": datetime.now().strftime('%Y-%m-%d'),
-                "time": datetime.now().strftime("%H:%M:%S"),
-                "sender": "Server",
-                "action": "channel_data",
-                "status": "error",
-                "message": f"채널 '{channel_name}'을 찾을 수 없습니다.",
-                "data": []
-            }
-            await websocket.send(json.dumps(response))
+        # 채널 메시지 가져오기 - 문서 단위가 아닌 배치 단위로 한 번에 조회
+        message_cursor = messages_collection.find(
+            {"workspace_id": workspace_id, "channel_id": channel_id},
+            MESSAGE_PROJECTION
+        ).sort("created_at", 1)
+        
+        if data.get("stream"):
+            # 대용량 채널은 여러 프레임으로 나누어 전송
+            await stream_channel_data(
+                websocket,
+                workspace_name,
+                channel_name,
+                message_cursor,
+                data.get("format") == "rows"
+            )
             return
             
-        # 채널 메시지 가져오기
-        messages = []
-        message_cursor = messages_collection.find({
-            "workspace_id": workspace["_id"],
-            "channel_id": channel["_id"]
-        }).sort("created_at", 1)
-        
-        async for msg in message_cursor:
-            messages.append({
+        documents = await message_cursor.batch_size(CHANNEL_DATA_BATCH_SIZE).to_list(length=None)
+        
+        response = envelope(
+            "channel_data",
+            workspace=workspace_name,
+            channel=channel_name
+        )
+        
+        if data.get("format") == "rows":
+            # 컬럼 목록과 행 배열로 전송 (메시지마다 딕셔너리를 만들지 않음)
+            response["columns"] = MESSAGE_COLUMNS
+            response["rows"] = [
+                [msg.get("date"), msg.get("time"), msg.get("sender"), msg.get("content")]
+                for msg in documents
+            ]
+        else:
+            response["message"] = [
+                {
+                    "date": msg.get("date"),
+                    "time": msg.get("time"),
+                    "sender": msg.get("sender"),
+                    "message": msg.get("content")
+                }
+                for msg in documents
+            ]
+        
+        send_response(websocket, response)
+    except Exception as e:
+        logger.error(f"채널 데이터 전송 중 오류: {str(e)}")
+        response = envelope(
+            "channel_data",
+            status="error",
+            message=[],
+            error=str(e)
+        )
+        send_response(websocket, response)
+
+async def stream_channel_data(websocket, workspace_name, channel_name, message_cursor, use_rows):
+    """채널 메시지를 시작/조각/종료 프레임으로 나누어 전송"""
+    key = "rows" if use_rows else "message"
+    
+    response = envelope(
+        "channel_data_begin",
+        workspace=workspace_name,
+        channel=channel_name
+    )
+    if use_rows:
+        response["columns"] = MESSAGE_COLUMNS
+    await send_response_wait(websocket, response)
+    
+    count = 0
+    batch = []
+    async for msg in message_cursor.batch_size(CHANNEL_DATA_CHUNK_SIZE):
+        if use_rows:
+            batch.append([msg.get("date"), msg.get("time"), msg.get("sender"), msg.get("content")])
+        else:
+            batch.append({
                 "date": msg.get("date"),
                 "time": msg.get("time"),
                 "sender": msg.get("sender"),
                 "message": msg.get("content")
             })
             
-        response = {
-            "date": datetime.now().strftime('%Y-%m-%d'),
-            "time": datetime.now().strftime("%H:%M:%S"),
-            "sender": "Server",
-            "action": "channel_data",
-            "workspace": workspace_name,
-            "channel": channel_name,
-            "message": messages
-        }
+        if len(batch) >= CHANNEL_DATA_CHUNK_SIZE:
+            await send_response_wait(websocket, envelope(
+                "channel_data_chunk",
+                workspace=workspace_name,
+                channel=channel_name,
+                **{key: batch}
+            ))
+            count += len(batch)
+            batch = []
+            
+    if batch:
+        await send_response_wait(websocket, envelope(
+            "channel_data_chunk",
+            workspace=workspace_name,
+            channel=channel_name,
+            **{key: batch}
+        ))
+        count += len(batch)
         
-        await websocket.send(json.dumps(response))
-    except Exception as e:
-        logger.error(f"채널 데이터 전송 중 오류: {str(e)}")
-        response = {
-            "date": datetime.now().strftime('%Y-%m-%d'),
-            "time": datetime.now().strftime("%H:%M:%S"),
-            "sender": "Server",
-            "action": "channel_data",
-            "status": "error",
-            "message": [],
-            "error": str(e)
-        }
-        await websocket.send(json.dumps(response))
+    response = envelope(
+        "channel_data_end",
+        workspace=workspace_name,
+        channel=channel_name,
+        count=count
+    )
+    await send_response_wait(websocket, response)
 
 async def search_messages(data, websocket):
     """메시지 검색"""
@@ -806,37 +1118,29 @@ async def search_messages(data, websocket):
     date_to = data.get("date_to", None)
     
     if not query:
-        response = {
-            "date": datetime.now().strftime('%Y-%m-%d'),
-            "time": datetime.now().strftime("%H:%M:%S"),
-            "sender": "Server",
-            "action": "search_response",
-            "status": "error",
-            "message": "검색어가 필요합니다.",
-            "results": []
-        }
-        await websocket.send(json.dumps(response))
+        response = envelope(
+            "search_response",
+            status="error",
+            message="검색어가 필요합니다.",
+            results=[]
+        )
+        send_response(websocket, response)
         return
         
     try:
-        search_filter = {"content": {"$regex": query, "$options": "i"}}
+        search_filter = {}
         
         # 워크스페이스 필터 추가
         if workspace_name:
-            workspace = await workspaces_collection.find_one({"name": workspace_name})
-            if workspace:
-                search_filter["workspace_id"] = workspace["_id"]
+            workspace_id = await get_workspace_id(workspace_name)
+            if workspace_id is not None:
+                search_filter["workspace_id"] = workspace_id
                 
-        # 채널 필터 추가
-        if channel_name and workspace_name:
-            workspace = await workspaces_collection.find_one({"name": workspace_name})
-            if workspace:
-                channel = await channels_collection.find_one({
-                    "name": channel_name,
-                    "workspace_id": workspace["_id"]
-                })
-                if channel:
-                    search_filter["channel_id"] = channel["_id"]
+                # 채널 필터 추가
+                if channel_name:
+                    channel_id = await get_channel_id(workspace_id, channel_name)
+                    if channel_id is not None:
+                        search_filter["channel_id"] = channel_id
                     
         # 보낸 사람 필터 추가
         if sender:
@@ -851,136 +1155,378 @@ async def search_messages(data, websocket):
         if date_filter:
             search_filter["date"] = date_filter
             
-        # 검색 실행
-        results = []
-        message_cursor = messages_collection.find(search_filter).sort("created_at", -1).limit(100)
-        
-        async for msg in message_cursor:
-            # 워크스페이스 정보 가져오기
-            workspace = await workspaces_collection.find_one({"_id": msg["workspace_id"]})
-            workspace_name = workspace["name"] if workspace else "Unknown"
+        # 단어로만 이루어진 검색어는 텍스트 인덱스로, 특수문자가 섞이면 정규식으로 검색
+        regex_search = (
+            {**search_filter, "content": {"$regex": re.escape(query), "$options": "i"}},
+            {"created_at": -1}
+        )
+        if SEARCH_NON_WORD.search(query):
+            searches = [regex_search]
+        else:
+            # 검색어 전체를 하나의 구문으로 검색 (단어별 OR 검색 방지)
+            # 텍스트 인덱스는 단어 단위라 조사가 붙은 한국어 등 부분 일치를 놓칠 수 있으므로
+            # 결과가 하나도 없을 때만 정규식으로 다시 검색
+            searches = [
+                ({**search_filter, "$text": {"$search": f'"{query}"'}}, {"score": {"$meta": "textScore"}, "created_at": -1}),
+                regex_search
+            ]
             
-            # 채널 정보 가져오기
-            channel = await channels_collection.find_one({"_id": msg["channel_id"]})
-            channel_name = channel["name"] if channel else "Unknown"
+        if data.get("stream"):
+            # 검색 결과를 여러 프레임으로 나누어 전송
+            await stream_search_results(websocket, query, searches)
+            return
             
-            results.append({
-                "date": msg.get("date"),
-                "time": msg.get("time"),
-                "sender": msg.get("sender"),
-                "message": msg.get("content"),
-                "workspace": workspace_name,
-                "channel": channel_name
-            })
+        results = [result async for result in iter_search(searches)]
             
-        response = {
-            "date": datetime.now().strftime('%Y-%m-%d'),
-            "time": datetime.now().strftime("%H:%M:%S"),
-            "sender": "Server",
-            "action": "search_response",
-            "status": "success",
-            "query": query,
-            "count": len(results),
-            "results": results
-        }
+        response = envelope(
+            "search_response",
+            status="success",
+            query=query,
+            count=len(results),
+            results=results
+        )
         
-        await websocket.send(json.dumps(response))
+        send_response(websocket, response)
     except Exception as e:
         logger.error(f"메시지 검색 중 오류: {str(e)}")
-        response = {
-            "date": datetime.now().strftime('%Y-%m-%d'),
-            "time": datetime.now().strftime("%H:%M:%S"),
-            "sender": "Server",
-            "action": "search_response",
-            "status": "error",
-            "message": f"검색 중 오류 발생: {str(e)}",
-            "results": []
-        }
-        await websocket.send(json.dumps(response))
+        response = envelope(
+            "search_response",
+            status="error",
+            message=f"검색 중 오류 발생: {str(e)}",
+            results=[]
+        )
+        send_response(websocket, response)
 
-async def broadcast(message, sender):
-    """모든 클라이언트에게 메시지 브로드캐스팅"""
-    for client in clients:
-        if client != sender:
-            try:
-                await client.send(message)
-            except Exception as e:
-                logger.error(f"브로드캐스팅 중 오류: {str(e)}")
+async def stream_search_results(websocket, query, searches):
+    """검색 결과를 페이지 단위 프레임과 종료 프레임으로 나누어 전송"""
+    count = 0
+    page = []
+    async for result in iter_search(searches):
+        page.append(result)
+        if len(page) >= SEARCH_PAGE_SIZE:
+            await send_response_wait(websocket, envelope(
+                "search_response_page",
+                query=query,
+                page=count // SEARCH_PAGE_SIZE,
+                results=page
+            ))
+            count += len(page)
+            page = []
+            
+    if page:
+        await send_response_wait(websocket, envelope(
+            "search_response_page",
+            query=query,
+            page=count // SEARCH_PAGE_SIZE,
+            results=page
+        ))
+        count += len(page)
+        
+    response = envelope(
+        "search_response_end",
+        status="success",
+        query=query,
+        count=count
+    )
+    await send_response_wait(websocket, response)
 
-async def broadcast_workspace_update():
-    """모든 클라이언트에게 워크스페이스 목록 업데이트 알림"""
-    workspaces = {}
+async def iter_search(searches):
+    """검색 실행 - searches의 (조건, 정렬)을 차례로 실행하여 결과가 나온 첫 검색만 반환"""
+    for search_filter, sort in searches:
+        found = False
+        async for msg in search_cursor(search_filter, sort):
+            found = True
+            yield msg
+        if found:
+            return
+
+def search_cursor(search_filter, sort):
+    """검색 aggregation 커서 반환"""
+    return messages_collection.aggregate([
+        {"$match": search_filter},
+        {"$sort": sort},
+        {"$limit": SEARCH_LIMIT},
+        {"$lookup": {
+            "from": "workspaces",
+            "localField": "workspace_id",
+            "foreignField": "_id",
+            "as": "workspace"
+        }},
+        {"$lookup": {
+            "from": "channels",
+            "localField": "channel_id",
+            "foreignField": "_id",
+            "as": "channel"
+        }},
+        # 응답 형식 그대로 MongoDB에서 만들어서 반환
+        {"$project": {
+            "_id": 0,
+            "date": 1,
+            "time": 1,
+            "sender": 1,
+            "message": "$content",
+            "workspace": {"$ifNull": [{"$arrayElemAt": ["$workspace.name", 0]}, "Unknown"]},
+            "channel": {"$ifNull": [{"$arrayElemAt": ["$channel.name", 0]}, "Unknown"]}
+        }}
+    ], batchSize=SEARCH_LIMIT)
+
+def send_response(websocket, response):
+    """응답을 직렬화하여 클라이언트 전송 큐에 추가"""
+    enqueue_message(websocket, json_dumps(response))
+
+async def send_response_wait(websocket, response):
+    """전송 큐에 여유가 생길 때까지 기다렸다가 응답 추가
+
+    큐를 가득 채우면 그 사이 들어오는 채팅 메시지 때문에 연결이 끊기므로
+    STREAM_QUEUE_HEADROOM만큼은 남겨둠
+    """
+    info = client_info.get(websocket)
+    if info is None:
+        return
+    payload = json_dumps(response)
     
-    try:
-        # 모든 워크스페이스 찾기
-        cursor = workspaces_collection.find().sort("name", 1)
-        async for workspace in cursor:
-            workspace_name = workspace["name"]
-            workspaces[workspace_name] = []
+    async def wait_for_room():
+        while info.queue.qsize() >= CLIENT_QUEUE_SIZE - STREAM_QUEUE_HEADROOM:
+            info.drained.clear()
+            await info.drained.wait()
             
-            # 해당 워크스페이스의 채널 찾기
-            channel_cursor = channels_collection.find({"workspace_id": workspace["_id"]}).sort("name", 1)
-            async for channel in channel_cursor:
-                workspaces[workspace_name].append(channel["name"])
+    # 연결이 끊겨 큐가 비워지지 않으면 제한 시간 후 중단
+    await asyncio.wait_for(wait_for_room(), SEND_TIMEOUT)
+    info.queue.put_nowait(payload)
+
+def enqueue_message(client, message, droppable=False):
+    """클라이언트 전송 큐에 메시지 추가
+
+    droppable이 참이면 큐가 가득 찼을 때 연결을 끊지 않고 이 메시지만 버림
+    (다음 알림이 최신 상태를 다시 보내는 목록 업데이트 알림용)
+    """
+    info = client_info.get(client)
+    if info is None:
+        return
+    try:
+        info.queue.put_nowait(message)
+    except asyncio.QueueFull:
+        if droppable:
+            return
+        # 이미 종료 중인 클라이언트는 다시 종료하지 않음
+        if client in clients:
+            logger.warning("전송 큐가 가득 차 클라이언트 연결을 종료합니다.")
+            drop_client(client)
+            task = asyncio.create_task(client.close(SLOW_CLIENT_CLOSE_CODE, "slow consumer"))
+            background_tasks.add(task)
+            task.add_done_callback(background_tasks.discard)
+
+async def relay_messages(websocket, queue):
+    """전송 큐의 메시지를 클라이언트에게 전달"""
+    try:
+        while True:
+            batch = [await queue.get()]
+            # 대기 중인 메시지를 모두 꺼내서 함께 전송
+            while True:
+                try:
+                    batch.append(queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+                    
+            info = client_info.get(websocket)
+            if info is not None:
+                # 스트리밍 중 큐 여유를 기다리는 작업 깨우기
+                info.drained.set()
+            if len(batch) > 1 and info is not None and info.batch:
+                # 배치 수신을 지원하는 클라이언트에게는 하나의 프레임으로 전송
+                batch = ['{"action":"batch","messages":[' + ",".join(batch) + "]}"]
                 
-        notification = {
-            "date": datetime.now().strftime('%Y-%m-%d'),
-            "time": datetime.now().strftime("%H:%M:%S"),
-            "sender": "Server",
-            "action": "workspace_update",
-            "message": workspaces
-        }
+            # 송신 버퍼가 제한 시간 동안 비워지지 않으면 느린 클라이언트로 보고 연결 종료
+            for message in batch:
+                await asyncio.wait_for(websocket.send(message), SEND_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning("전송이 지연되어 클라이언트 연결을 종료합니다.")
+        drop_client(websocket)
+        await websocket.close(SLOW_CLIENT_CLOSE_CODE, "slow consumer")
+    except websockets.exceptions.ConnectionClosed:
+        # 수신 루프가 끝나기 전에도 더 이상 브로드캐스트 대상이 되지 않도록 바로 제외
+        drop_client(websocket)
+
+def drop_client(websocket):
+    """클라이언트를 브로드캐스트 대상과 구독 목록에서 제외"""
+    clients.discard(websocket)
+    unsubscribe_channel(websocket)
+    unsubscribe_workspace(websocket)
+
+def subscribe_channel(websocket, workspace_name, channel_name):
+    """클라이언트를 채널 구독자로 등록 - 기존 구독은 해제"""
+    info = client_info.get(websocket)
+    if info is None:
+        return
+    unsubscribe_channel(websocket)
+    key = (workspace_name, channel_name)
+    channel_subscribers.setdefault(key, set()).add(websocket)
+    info.channel = key
+
+def unsubscribe_channel(websocket):
+    """클라이언트의 채널 구독 해제"""
+    info = client_info.get(websocket)
+    if info is None or info.channel is None:
+        return
+    subscribers = channel_subscribers.get(info.channel)
+    if subscribers is not None:
+        subscribers.discard(websocket)
+        if not subscribers:
+            del channel_subscribers[info.channel]
+    info.channel = None
+
+def subscribe_workspace(websocket, workspace_name):
+    """클라이언트를 워크스페이스 구독자로 등록 - 기존 구독은 해제"""
+    info = client_info.get(websocket)
+    if info is None or info.workspace == workspace_name:
+        return
+    unsubscribe_workspace(websocket)
+    workspace_subscribers.setdefault(workspace_name, set()).add(websocket)
+    info.workspace = workspace_name
+
+def unsubscribe_workspace(websocket):
+    """클라이언트의 워크스페이스 구독 해제"""
+    info = client_info.get(websocket)
+    if info is None or info.workspace is None:
+        return
+    subscribers = workspace_subscribers.get(info.workspace)
+    if subscribers is not None:
+        subscribers.discard(websocket)
+        if not subscribers:
+            del workspace_subscribers[info.workspace]
+    info.workspace = None
+
+def move_channel_subscribers(old_key, new_key):
+    """채널 구독자를 새 (워크스페이스, 채널) 키로 옮김 - new_key가 None이면 구독 해제"""
+    subscribers = channel_subscribers.pop(old_key, None)
+    if not subscribers:
+        return
+    if new_key is not None:
+        channel_subscribers.setdefault(new_key, set()).update(subscribers)
+    for client in subscribers:
+        info = client_info.get(client)
+        if info is not None:
+            info.channel = new_key
+
+def move_workspace_subscribers(old_name, new_name):
+    """워크스페이스와 그 채널의 구독자를 새 이름으로 옮김 - new_name이 None이면 구독 해제"""
+    subscribers = workspace_subscribers.pop(old_name, None)
+    if subscribers:
+        if new_name is not None:
+            workspace_subscribers.setdefault(new_name, set()).update(subscribers)
+        for client in subscribers:
+            info = client_info.get(client)
+            if info is not None:
+                info.workspace = new_name
+                
+    for key in [key for key in channel_subscribers if key[0] == old_name]:
+        move_channel_subscribers(key, None if new_name is None else (new_name, key[1]))
+
+async def broadcast(message, sender, workspace_name, channel_name):
+    """해당 채널을 구독 중인 클라이언트에게 메시지 브로드캐스팅"""
+    for client in list(channel_subscribers.get((workspace_name, channel_name), ())):
+        if client is not sender:
+            enqueue_message(client, message)
+
+async def broadcast_workspace_update():
+    """모든 클라이언트에게 워크스페이스 목록 업데이트 알림"""
+    try:
+        # 워크스페이스와 채널을 한 번의 aggregation으로 조회 (캐시 공유)
+        workspaces = await get_workspace_tree()
+        
+        notification = envelope(
+            "workspace_update",
+            message=workspaces
+        )
         
-        for client in clients:
-            try:
-                await client.send(json.dumps(notification))
-            except Exception as e:
-                logger.error(f"워크스페이스 업데이트 알림 중 오류: {str(e)}")
+        # 한 번만 직렬화하여 모든 클라이언트에게 같은 데이터 전송
+        payload = json_dumps(notification)
+        for client in list(clients):
+            enqueue_message(client, payload, droppable=True)
     except Exception as e:
         logger.error(f"워크스페이스 업데이트 알림 생성 중 오류: {str(e)}")
 
 async def broadcast_channel_update(workspace_name):
     """특정 워크스페이스의 모든 클라이언트에게 채널 목록 업데이트 알림"""
-    channels = []
-    
     try:
-        # 워크스페이스 찾기
-        workspace = await workspaces_collection.find_one({"name": workspace_name})
+        # 캐시된 워크스페이스별 채널 목록에서 조회
+        workspaces = await get_workspace_tree()
+        channels = workspaces.get(workspace_name, [])
         
-        if workspace:
-            # 해당 워크스페이스의 채널 찾기
-            channel_cursor = channels_collection.find({"workspace_id": workspace["_id"]}).sort("name", 1)
-            async for channel in channel_cursor:
-                channels.append(channel["name"])
-                
-        notification = {
-            "date": datetime.now().strftime('%Y-%m-%d'),
-            "time": datetime.now().strftime("%H:%M:%S"),
-            "sender": "Server",
-            "action": "channel_update",
-            "workspace": workspace_name,
-            "message": channels
-        }
+        notification = envelope(
+            "channel_update",
+            workspace=workspace_name,
+            message=channels
+        )
         
         # 해당 워크스페이스를 구독 중인 클라이언트에게만 전송
-        for client, info in client_info.items():
-            if info.get("workspace") == workspace_name:
-                try:
-                    await client.send(json.dumps(notification))
-                except Exception as e:
-                    logger.error(f"채널 업데이트 알림 중 오류: {str(e)}")
+        payload = json_dumps(notification)
+        for client in list(workspace_subscribers.get(workspace_name, ())):
+            enqueue_message(client, payload, droppable=True)
     except Exception as e:
         logger.error(f"채널 업데이트 알림 생성 중 오류: {str(e)}")
 
+# 액션별 처리 함수 (send_message는 받은 프레임이 필요하므로 handle_message에서 직접 처리)
+ACTION_HANDLERS = {
+    "register_user": register_user,
+    "get_workspace_list": send_workspace_list,
+    "get_channel_list": send_channel_list,
+    "get_channel_data": send_channel_data,
+    "create_workspace": create_workspace,
+    "create_channel": create_channel,
+    "delete_workspace": delete_workspace,
+    "delete_channel": delete_channel,
+    "update_workspace": update_workspace,
+    "update_channel": update_channel,
+    "search": search_messages
+}
+
 async def main():
     """메인 서버 실행 함수"""
     # 데이터베이스 초기화
     await initialize_db()
     
-    # 웹소켓 서버 시작
-    async with websockets.serve(handle_client, HOST, PORT):
-        logger.info(f"서버가 {HOST}:{PORT}에서 시작되었습니다.")
-        await asyncio.Future()  # 무한 실행
+    # 메시지 저장 작업 시작
+    writer_task = asyncio.create_task(message_writer())
+    
+    try:
+        # 웹소켓 서버 시작
+        # 클라이언트마다 프레임을 다시 압축하지 않도록 permessage-deflate 비활성화
+        async with websockets.serve(
+            handle_client, HOST, PORT,
+            compression=None,
+            write_limit=WRITE_LIMIT,
+            max_size=MAX_MESSAGE_SIZE
+        ):
+            logger.info(f"서버가 {HOST}:{PORT}에서 시작되었습니다.")
+            await asyncio.Future()  # 무한 실행
+    finally:
+        # 종료 전에 남은 메시지 저장 - 저장 작업이 모으던 메시지를 큐로 되돌릴 때까지 대기
+        writer_task.cancel()
+        try:
+            await writer_task
+        except asyncio.CancelledError:
+            pass
+        remaining = []
+        while not message_queue.empty():
+            remaining.append(message_queue.get_nowait())
+        if remaining:
+            await messages_collection.insert_many(remaining, ordered=False)
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    # uvloop이 설치되어 있으면 기본 이벤트 루프 대신 사용
+    try:
+        import uvloop
+        run = uvloop.run
+    except ImportError:
+        run = asyncio.run
+    except AttributeError:
+        # uvloop.run이 없는 이전 버전
+        uvloop.install()
+        run = asyncio.run
+        
+    log_listener.start()
+    try:
+        run(main())
+    finally:
+        log_listener.stop()
\ No newline at end of file